@@ -3,6 +3,7 @@ import json
 import datetime
 import os
 import time
+import random
 import pytz
 import gspread
 from google.oauth2.service_account import Credentials
@@ -21,6 +22,11 @@ st.set_page_config(
 
 # Constantes del Sistema
 MIN_MINUTES_PER_TASK = 40  # Mínimo tiempo productivo por tarea (Técnica Pomodoro)
+REVIEW_BATCH_SIZE = 10     # Evaluaciones acumuladas antes de volcar a Sheets en la sesión de repaso
+DASHBOARD_DAYS = 30        # Ventana de días que muestra el panel (y que se conserva en stats["daily"])
+EXAM_TOPICS_PER_SUBJECT = 4  # Preguntas (temas) por hoja de simulacro
+EXAM_HISTORY_LIMIT = 20    # Simulacros corregidos que se conservan (todo vive en la celda A1)
+META_KEYS = ["general_notes", "stats", "exams"]  # Claves del JSON que no son asignaturas
 
 # Estilos CSS Personalizados para modo Dark/Elite
 st.markdown("""
@@ -189,7 +195,8 @@ def get_google_sheet():
 
 def create_defaults():
     new_data = {
-        "general_notes": [] # Estructura para notas manuales
+        "general_notes": [], # Estructura para notas manuales
+        "exams": []          # Registro de simulacros corregidos
     }
     for subject, info in DEFAULT_SYLLABUS.items():
         new_data[subject] = []
@@ -203,6 +210,7 @@ def create_defaults():
                 "last_error": "",
                 "extra_queue": False     
             })
+    new_data["stats"] = build_stats(new_data)
     return new_data
 
 def load_data():
@@ -216,10 +224,14 @@ def load_data():
             # Asegurar compatibilidad si se añaden claves nuevas (como notas)
             if "general_notes" not in data:
                 data["general_notes"] = []
+            if "exams" not in data:
+                data["exams"] = []
             
             # Chequeo de integridad: Si hay nuevas asignaturas en el código que no están en la BD, añadirlas
+            needs_stats = "stats" not in data
             for subj, info in DEFAULT_SYLLABUS.items():
                 if subj not in data:
+                    needs_stats = True
                     data[subj] = []
                     for topic in info["topics"]:
                         data[subj].append({
@@ -229,6 +241,9 @@ def load_data():
                             "next_review": str(datetime.date.today()), 
                             "last_error": "", "extra_queue": False
                         })
+            # Los agregados se recalculan solo al migrar; después se mantienen en cada cambio
+            if needs_stats:
+                data["stats"] = build_stats(data, data.get("stats", {}).get("daily"))
             return data
         else:
             defaults = create_defaults()
@@ -411,7 +426,425 @@ def get_current_block():
     return "free", "⏳ Tiempo Libre", 0, 0
 
 # ==========================================
-# 6. INTERFAZ PRINCIPAL
+# 6. LÓGICA DE REPASO (ESPACIADO + SESIÓN RÁPIDA)
+# ==========================================
+
+def apply_grade(topic, grade, error_note=""):
+    """Aplica una evaluación ('ok', 'mid', 'bad') al tema según el repaso espaciado"""
+    today = datetime.date.today()
+    topic["last_review"] = str(today)
+    if grade == "ok":
+        topic["level"] = min(topic["level"] + 1, 5)
+        days = (topic["level"] * 5) + 3
+        topic["next_review"] = str(today + datetime.timedelta(days=days))
+        topic["extra_queue"] = False
+    elif grade == "mid":
+        topic["next_review"] = str(today + datetime.timedelta(days=3))
+        topic["extra_queue"] = False
+    elif grade == "bad":
+        topic["level"] = 1
+        topic["next_review"] = str(today + datetime.timedelta(days=1))
+        if error_note: topic["last_error"] = error_note
+
+def grade_topic(data, subj, topic, grade, error_note="", seconds=0):
+    """Evalúa un tema y actualiza los agregados de estadísticas con el cambio"""
+    before = topic_snapshot(topic)
+    apply_grade(topic, grade, error_note)
+    stats_topic_changed(data["stats"], subj, before, topic)
+    stats_record_review(data["stats"], topic.get("category", "memory"), grade, seconds)
+
+def get_due_tasks(data, target_type):
+    """Temas pendientes para el bloque actual, ordenados por prioridad"""
+    tasks = []
+    today_date = datetime.date.today()
+
+    for subj, topic_list in data.items():
+        if subj in META_KEYS: continue # Ignorar notas generales y estadísticas aquí
+        for i, topic in enumerate(topic_list):
+            is_due = (topic["next_review"] <= str(today_date)) or topic["extra_queue"]
+
+            # Filtrado inteligente por bloque horario
+            match_category = False
+            if target_type == "mix": match_category = True
+            elif target_type == "science" and (topic["category"] in ["science", "skills"]): match_category = True
+            elif target_type == "memory" and topic["category"] == "memory": match_category = True
+
+            if topic["unlocked"] and is_due and match_category:
+                due_date = datetime.datetime.strptime(topic["next_review"], "%Y-%m-%d").date()
+                days_overdue = (today_date - due_date).days
+                tasks.append({"subj": subj, "topic": topic, "idx": i, "days_overdue": days_overdue})
+
+    # Algoritmo de Prioridad: 1. Fuego manual, 2. Retraso, 3. Nivel (más difícil primero)
+    tasks.sort(key=lambda x: (not x["topic"]["extra_queue"], -x["days_overdue"], x["topic"]["level"]))
+    return tasks
+
+def start_review_session(tasks):
+    """Crea una sesión de repaso: las notas se acumulan en local y se vuelcan por lotes"""
+    st.session_state.review_session = {
+        "queue": [(t["subj"], t["idx"]) for t in tasks],
+        "pos": 0,
+        "pending": [],   # (asignatura, índice, nota, motivo, segundos) aún sin guardar
+        "reviewed": 0,
+        "writes": 0,
+        "start": time.time(),
+        "last_mark": time.time(),
+        "end": None,
+    }
+
+def apply_pending_grades(session):
+    """Aplica en memoria las evaluaciones pendientes, sin escribir en Sheets"""
+    data = st.session_state.data
+    for subj, idx, grade, note, seconds in session["pending"]:
+        topic_list = data.get(subj)
+        if isinstance(topic_list, list) and idx < len(topic_list):
+            grade_topic(data, subj, topic_list[idx], grade, note, seconds)
+    session["pending"] = []
+
+def flush_review_session(session):
+    """Vuelca las evaluaciones pendientes con una única escritura en Sheets"""
+    if not session["pending"]: return
+    apply_pending_grades(session)
+    save_data(st.session_state.data)
+    session["writes"] += 1
+
+def finish_review_session():
+    session = st.session_state.review_session
+    flush_review_session(session)
+    session["end"] = time.time()
+
+def grade_in_session(grade):
+    """Callback de los botones de la sesión: registra la nota sin guardar ni forzar rerun"""
+    session = st.session_state.review_session
+    if session["end"] or session["pos"] >= len(session["queue"]): return
+    subj, idx = session["queue"][session["pos"]]
+    note = st.session_state.get("rs_error", "").strip() if grade == "bad" else ""
+    now = time.time()
+    session["pending"].append((subj, idx, grade, note, now - session["last_mark"]))
+    session["last_mark"] = now
+    session["reviewed"] += 1
+    session["pos"] += 1
+    if len(session["pending"]) >= REVIEW_BATCH_SIZE: flush_review_session(session)
+    if session["pos"] >= len(session["queue"]): finish_review_session()
+
+def close_review_session():
+    del st.session_state["review_session"]
+
+def inject_review_shortcuts(active=True):
+    """
+    Atajos de teclado (1/2/3 evalúan, F termina). Con active=True registra un
+    único listener en el documento padre que solo pulsa botones visibles (las
+    pestañas ocultas siguen en el DOM); con active=False lo retira.
+    """
+    st.session_state["review_shortcuts"] = active
+    components_html("""
+    <script>
+    (function(){
+      const doc = window.parent.document;
+      if (doc._pauReviewKeys) {
+        doc.removeEventListener("keydown", doc._pauReviewKeys);
+        doc._pauReviewKeys = null;
+      }
+      if (!%s) return;
+      const keys = {"1": "[1]", "2": "[2]", "3": "[3]", "f": "[F]"};
+      doc._pauReviewKeys = function(e) {
+        const tag = (e.target.tagName || "").toLowerCase();
+        if (tag === "input" || tag === "textarea" || e.ctrlKey || e.metaKey || e.altKey) return;
+        const label = keys[(e.key || "").toLowerCase()];
+        if (!label) return;
+        const btn = Array.from(doc.querySelectorAll("button"))
+          .find(b => b.offsetParent !== null && b.innerText.includes(label));
+        if (btn) { e.preventDefault(); btn.click(); }
+      };
+      doc.addEventListener("keydown", doc._pauReviewKeys);
+    })();
+    </script>
+    """ % ("true" if active else "false"), height=0)
+
+def show_review_session(session):
+    """Interfaz de la sesión de repaso: un tema cada vez y resumen final con ritmo"""
+    data = st.session_state.data
+
+    if session["end"]:
+        elapsed_min = max((session["end"] - session["start"]) / 60.0, 1 / 60.0)
+        st.subheader("🏁 Sesión terminada")
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Repasos", f"{session['reviewed']}")
+        c2.metric("Tiempo", f"{elapsed_min:.1f} min")
+        c3.metric("Ritmo", f"{session['reviewed'] / elapsed_min:.1f} rep/min")
+        c4.metric("Guardados", f"{session['writes']}")
+        if st.session_state.get("review_shortcuts"): inject_review_shortcuts(active=False)
+        st.button("Cerrar sesión", on_click=close_review_session)
+        return
+
+    # Saltamos temas que ya no existen (asignatura eliminada, reset...)
+    while session["pos"] < len(session["queue"]):
+        subj, idx = session["queue"][session["pos"]]
+        if isinstance(data.get(subj), list) and idx < len(data[subj]): break
+        session["pos"] += 1
+    if session["pos"] >= len(session["queue"]):
+        finish_review_session()
+        st.rerun()
+    topic = data[subj][idx]
+
+    st.caption(f"⚡ Sesión de repaso • {session['pos'] + 1}/{len(session['queue'])} • Sin guardar: {len(session['pending'])}")
+    st.progress(session["pos"] / len(session["queue"]))
+
+    with st.container(border=True):
+        badges = []
+        if topic["extra_queue"]: badges.append("🔥 URGENTE")
+        st.caption(f"{' '.join(badges)} • {subj}")
+        st.subheader(topic["name"])
+        st.progress(topic['level']/5)
+        if topic["last_error"]: st.error(f"⚠️ Fallo previo: {topic['last_error']}")
+
+        b1, b2 = st.columns(2)
+        b1.button("✅ Bien [1]", key="rs_ok", on_click=grade_in_session, args=("ok",))
+        b2.button("🆗 Regular [2]", key="rs_mid", on_click=grade_in_session, args=("mid",))
+        # El motivo va en un formulario: Enter en el campo equivale a pulsar ❌
+        with st.form(key="rs_fail_form", clear_on_submit=True):
+            st.text_input("¿Motivo del fallo? (Enter = ❌)", key="rs_error")
+            st.form_submit_button("❌ Fallo [3]", on_click=grade_in_session, args=("bad",))
+
+    st.button("🏁 Terminar y guardar [F]", key="rs_finish", on_click=finish_review_session)
+    st.caption("Atajos: 1 = ✅ · 2 = 🆗 · 3 = ❌ · F = terminar")
+    inject_review_shortcuts()
+
+# ==========================================
+# 7. ESTADÍSTICAS INCREMENTALES
+# ==========================================
+# data["stats"] guarda agregados que se actualizan en cada cambio de estado
+# (nunca recorriendo todo el temario en cada rerun):
+#   subjects: {asignatura: {"active", "total"}}
+#   levels:   histograma de niveles 0-5 de los temas activos
+#   due:      {categoría: {fecha next_review: nº temas activos}} -> atrasados = fechas < hoy
+#   daily:    últimos DASHBOARD_DAYS días, {fecha: {"reviews", "ok", "mid", "bad", "by_cat": {categoría: {"reviews", "sec"}}}}
+
+def empty_stats():
+    return {"subjects": {}, "levels": [0] * 6, "due": {}, "daily": {}}
+
+def topic_snapshot(topic):
+    """Parte del tema que afecta a los agregados; se toma antes de modificarlo"""
+    return {
+        "unlocked": bool(topic.get("unlocked")),
+        "level": min(max(int(topic.get("level", 0)), 0), 5),
+        "category": topic.get("category", "memory"),
+        "next_review": topic.get("next_review", str(datetime.date.today())),
+    }
+
+def _stats_apply(stats, subj, snap, sign, count_total=False):
+    """Suma (sign=1) o resta (sign=-1) la contribución de un tema a los agregados"""
+    subj_stats = stats["subjects"].setdefault(subj, {"active": 0, "total": 0})
+    if count_total: subj_stats["total"] += sign
+    if not snap["unlocked"]: return
+    subj_stats["active"] += sign
+    stats["levels"][snap["level"]] += sign
+    cat_due = stats["due"].setdefault(snap["category"], {})
+    cat_due[snap["next_review"]] = cat_due.get(snap["next_review"], 0) + sign
+    if cat_due[snap["next_review"]] <= 0: del cat_due[snap["next_review"]]
+
+def stats_topic_changed(stats, subj, before, topic):
+    _stats_apply(stats, subj, before, -1)
+    _stats_apply(stats, subj, topic_snapshot(topic), 1)
+
+def stats_topic_added(stats, subj, topic):
+    _stats_apply(stats, subj, topic_snapshot(topic), 1, count_total=True)
+
+def stats_record_review(stats, category, grade, seconds=0):
+    """Acumula la evaluación en el resumen diario (rollup) de hoy"""
+    today = datetime.date.today()
+    if str(today) not in stats["daily"]:
+        # Día nuevo: descartamos los resúmenes fuera de la ventana para que la celda A1 no crezca
+        cutoff = str(today - datetime.timedelta(days=DASHBOARD_DAYS - 1))
+        for d in [d for d in stats["daily"] if d < cutoff]: del stats["daily"][d]
+    day = stats["daily"].setdefault(str(today),
+                                    {"reviews": 0, "ok": 0, "mid": 0, "bad": 0, "by_cat": {}})
+    day["reviews"] += 1
+    day[grade] += 1
+    cat = day["by_cat"].setdefault(category, {"reviews": 0, "sec": 0})
+    cat["reviews"] += 1
+    cat["sec"] += int(seconds)
+
+def build_stats(data, daily=None):
+    """
+    Recalcula los agregados desde cero. Solo se usa al migrar datos antiguos
+    (load_data) y al eliminar una asignatura; conserva el histórico diario
+    que se le pase en 'daily'.
+    """
+    stats = empty_stats()
+    if daily: stats["daily"] = daily
+    for subj, topic_list in data.items():
+        if subj in META_KEYS or not isinstance(topic_list, list): continue
+        stats["subjects"][subj] = {"active": 0, "total": 0}
+        for topic in topic_list:
+            if isinstance(topic, dict): stats_topic_added(stats, subj, topic)
+    return stats
+
+def overdue_by_category(stats):
+    """Temas activos con next_review anterior a hoy, por categoría"""
+    today = str(datetime.date.today())
+    return {cat: sum(n for d, n in dates.items() if d < today) for cat, dates in stats["due"].items()}
+
+# ==========================================
+# 8. SIMULACROS (MUESTREO PONDERADO)
+# ==========================================
+
+exam_rng = random.Random()
+
+def exam_weight(topic, today):
+    """
+    Peso de un tema en el simulacro: más peso a niveles bajos, fallos recientes
+    y temas sin repasar hace tiempo; menos si ya salió en un simulacro reciente.
+    """
+    level = min(max(int(topic.get("level", 0)), 0), 5)
+    weight = 6 - level
+    if topic.get("last_error"): weight *= 2
+    # Sin 'last_review' (datos antiguos) usamos next_review como aproximación
+    last = topic.get("last_review") or topic.get("next_review") or str(today)
+    days = (today - datetime.datetime.strptime(last, "%Y-%m-%d").date()).days
+    weight *= 1 + min(max(days, 0), 60) / 15
+    if topic.get("last_exam"):
+        since_exam = (today - datetime.datetime.strptime(topic["last_exam"], "%Y-%m-%d").date()).days
+        if since_exam < 7: weight *= 0.5
+    return weight
+
+def build_alias_table(weights):
+    """Tabla de alias de Vose: O(n) de preparación y O(1) por muestra"""
+    n = len(weights)
+    total = float(sum(weights))
+    prob = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] = prob[l] + prob[s] - 1.0
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large: prob[i] = 1.0
+    return prob, alias
+
+def build_exam_sampler(topic_list):
+    """Precalcula la tabla de alias de una asignatura (solo temas activos)"""
+    today = datetime.date.today()
+    indices = [i for i, t in enumerate(topic_list) if isinstance(t, dict) and t.get("unlocked")]
+    if not indices: return None
+    prob, alias = build_alias_table([exam_weight(topic_list[i], today) for i in indices])
+    return {"indices": indices, "prob": prob, "alias": alias}
+
+def sample_exam(sampler, k):
+    """Elige k temas distintos; coste O(k) esperado gracias a la tabla de alias"""
+    indices, prob, alias = sampler["indices"], sampler["prob"], sampler["alias"]
+    n = len(indices)
+    if k >= n: return list(indices)
+    picked = set()
+    attempts = 0
+    while len(picked) < k and attempts < 20 * k:
+        j = exam_rng.randrange(n)
+        picked.add(j if exam_rng.random() < prob[j] else alias[j])
+        attempts += 1
+    # Pesos muy desiguales: completamos al azar entre los que faltan
+    if len(picked) < k:
+        picked.update(exam_rng.sample([j for j in range(n) if j not in picked], k - len(picked)))
+    return sorted(indices[j] for j in picked)
+
+def generate_exams(data, subjects, k, count):
+    """
+    Genera 'count' simulacros distintos por asignatura reutilizando la misma
+    tabla de alias. No modifica los datos: solo se registra lo que se corrige.
+    """
+    result = {}
+    for subj in subjects:
+        sampler = build_exam_sampler(data.get(subj, []))
+        if not sampler: continue
+        exams, seen = [], set()
+        for _ in range(count):
+            exam = sample_exam(sampler, k)
+            # Reintentos para no repetir hojas dentro del mismo lote
+            for _ in range(10):
+                if tuple(exam) not in seen: break
+                exam = sample_exam(sampler, k)
+            seen.add(tuple(exam))
+            exams.append(exam)
+        result[subj] = exams
+    return result
+
+def grade_simulacro(subj, form_key):
+    """
+    Callback del formulario de corrección: evalúa todos los temas, registra el
+    simulacro (nombre y posición de cada tema) y marca last_exam, con una
+    sola escritura.
+    """
+    data = st.session_state.data
+    today = str(datetime.date.today())
+    exam = [i for i in st.session_state.simulacros["exams"][subj][0] if i < len(data.get(subj, []))]
+    for i in exam:
+        grade = st.session_state.get(f"{form_key}_{i}", "ok")
+        grade_topic(data, subj, data[subj][i], grade)
+        data[subj][i]["last_exam"] = today
+    if exam:
+        data["exams"].append({"date": today, "subject": subj,
+                              "topics": [{"idx": i, "name": data[subj][i]["name"]} for i in exam]})
+        del data["exams"][:-EXAM_HISTORY_LIMIT]
+    save_data(data)
+    del st.session_state.simulacros["exams"][subj]
+    if not st.session_state.simulacros["exams"]:
+        del st.session_state["simulacros"]
+        st.session_state["simulacro_done"] = True
+
+def show_simulacro_generator(data):
+    """Bloque de simulacro: genera hojas de examen por asignatura (individual o para clase)"""
+    subjects = [k for k in data if k not in META_KEYS]
+    c1, c2, c3 = st.columns([0.5, 0.25, 0.25])
+    chosen = c1.multiselect("Asignaturas", subjects, default=subjects, key="sim_subjects")
+    k = c2.number_input("Preguntas por examen", 1, 10, EXAM_TOPICS_PER_SUBJECT, key="sim_k")
+    count = c3.number_input("Exámenes por asignatura", 1, 100, 1, key="sim_count",
+                            help="Más de 1 genera hojas distintas para toda la clase")
+
+    if st.session_state.pop("simulacro_done", False):
+        st.success("✅ Simulacro corregido y guardado.")
+
+    if st.button("📝 Generar simulacro"):
+        exams = generate_exams(data, chosen, int(k), int(count))
+        st.session_state.simulacros = {"count": int(count), "exams": exams}
+        st.rerun()
+
+    sims = st.session_state.get("simulacros")
+    if not sims: return
+    if not sims["exams"]:
+        st.info("No hay temas activos en esas asignaturas. Activa temas en 'Temario' para poder generar simulacros.")
+        return
+
+    st.divider()
+    grade_labels = {"ok": "✅", "mid": "🆗", "bad": "❌"}
+    for subj, exams in sims["exams"].items():
+        topic_list = data.get(subj, [])
+        if sims["count"] == 1:
+            # Simulacro individual: se corrige aquí con una sola escritura
+            with st.container(border=True):
+                st.subheader(f"📝 {subj}")
+                form_key = f"sim_{str(subj).strip().replace(' ', '_')}"
+                with st.form(key=form_key):
+                    for n, i in enumerate(exams[0], start=1):
+                        if i >= len(topic_list): continue
+                        st.write(f"**{n}.** {topic_list[i]['name']}")
+                        if topic_list[i].get("last_error"): st.caption(f"⚠️ Fallo previo: {topic_list[i]['last_error']}")
+                        st.radio("Resultado", list(grade_labels), format_func=grade_labels.get,
+                                 horizontal=True, key=f"{form_key}_{i}", label_visibility="collapsed")
+                    st.form_submit_button("Corregir simulacro", on_click=grade_simulacro, args=(subj, form_key))
+        else:
+            with st.expander(f"**{subj}** ({len(exams)} exámenes)"):
+                for n, exam in enumerate(exams, start=1):
+                    names = [topic_list[i]["name"] for i in exam if i < len(topic_list)]
+                    st.markdown(f"**Examen {n}:** " + " · ".join(names))
+
+    if sims["count"] > 1:
+        sheets = {subj: [[data[subj][i]["name"] for i in exam if i < len(data.get(subj, []))] for exam in exams]
+                  for subj, exams in sims["exams"].items()}
+        st.download_button("⬇️ Descargar hojas (JSON)", json.dumps(sheets, ensure_ascii=False, indent=2),
+                           file_name=f"simulacros_{datetime.date.today()}.json", mime="application/json")
+
+# ==========================================
+# 9. INTERFAZ PRINCIPAL
 # ==========================================
 
 if 'data' not in st.session_state:
@@ -429,14 +862,11 @@ with st.sidebar:
     if duration > 0: st.metric("Tiempo Bloque", f"{duration} min")
     
     st.divider()
-    # Cálculo estadísticas
-    total_unlocked = 0
-    for subj in data:
-        if subj == "general_notes": continue
-        total_unlocked += sum(1 for t in data[subj] if t.get("unlocked"))
+    # Estadísticas (agregados precalculados)
+    total_unlocked = sum(s["active"] for s in data["stats"]["subjects"].values())
     st.write(f"📈 Temas activos: **{total_unlocked}**")
 
-tab1, tab2, tab3, tab4 = st.tabs(["🚀 Agenda", "📚 Temario", "📓 Notas y Errores", "⚙️ Ajustes"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["🚀 Agenda", "📚 Temario", "📓 Notas y Errores", "📊 Progreso", "⚙️ Ajustes"])
 
 # ==========================================
 # TAB 1: AGENDA INTELIGENTE
@@ -447,32 +877,20 @@ with tab1:
     if force_study and real_type in ["gym", "break", "free", "sleep"]: target_type = "mix"
     else: target_type = real_type
 
-    if target_type in ["gym", "break", "sleep", "free"]:
+    # Sesión cerrada (o borrada por reset/eliminar asignatura): retiramos los atajos
+    if "review_session" not in st.session_state and st.session_state.get("review_shortcuts"):
+        inject_review_shortcuts(active=False)
+
+    if "review_session" in st.session_state:
+        show_review_session(st.session_state.review_session)
+    elif target_type in ["gym", "break", "sleep", "free"]:
         st.success(f"🛑 **STOP.** Descansa. El cerebro consolida lo estudiado ahora.")
     elif target_type == "review":
         st.info("📅 **Domingo:** Ve a la pestaña '📓 Notas y Errores' y organiza la semana.")
+    elif target_type == "simulacro":
+        show_simulacro_generator(data)
     else:
-        tasks = []
-        today_date = datetime.date.today()
-        
-        for subj, topic_list in data.items():
-            if subj == "general_notes": continue # Ignorar notas generales aquí
-            for i, topic in enumerate(topic_list):
-                is_due = (topic["next_review"] <= str(today_date)) or topic["extra_queue"]
-                
-                # Filtrado inteligente por bloque horario
-                match_category = False
-                if target_type in ["simulacro", "mix"]: match_category = True
-                elif target_type == "science" and (topic["category"] in ["science", "skills"]): match_category = True
-                elif target_type == "memory" and topic["category"] == "memory": match_category = True
-                
-                if topic["unlocked"] and is_due and match_category:
-                    due_date = datetime.datetime.strptime(topic["next_review"], "%Y-%m-%d").date()
-                    days_overdue = (today_date - due_date).days
-                    tasks.append({"subj": subj, "topic": topic, "idx": i, "days_overdue": days_overdue})
-
-        # Algoritmo de Prioridad: 1. Fuego manual, 2. Retraso, 3. Nivel (más difícil primero)
-        tasks.sort(key=lambda x: (not x["topic"]["extra_queue"], -x["days_overdue"], x["topic"]["level"]))
+        tasks = get_due_tasks(data, target_type)
         max_tasks = int(duration / MIN_MINUTES_PER_TASK) if duration > 0 else 5
         if max_tasks < 1: max_tasks = 1
         
@@ -487,6 +905,10 @@ with tab1:
             c2.metric("Min/Tarea", f"{time_per} min")
             c3.metric("Pendientes", f"+{len(tasks) - len(selected)}")
             
+            if st.button(f"⚡ Sesión de repaso rápido ({len(tasks)} temas, teclado)"):
+                start_review_session(tasks)
+                st.rerun()
+
             st.divider()
 
             for t in selected:
@@ -510,21 +932,16 @@ with tab1:
                         b1, b2, b3 = st.columns(3)
                         # Botones Repaso Espaciado
                         if b1.button("✅", key=f"ok_{subj}_{idx}"):
-                            topic["level"] = min(topic["level"] + 1, 5)
-                            days = (topic["level"] * 5) + 3 
-                            topic["next_review"] = str(datetime.date.today() + datetime.timedelta(days=days))
-                            topic["extra_queue"] = False
+                            grade_topic(data, subj, topic, "ok")
                             save_data(st.session_state.data)
                             st.rerun()
                         if b2.button("🆗", key=f"mid_{subj}_{idx}"):
-                            topic["next_review"] = str(datetime.date.today() + datetime.timedelta(days=3))
-                            topic["extra_queue"] = False
+                            grade_topic(data, subj, topic, "mid")
                             save_data(st.session_state.data)
                             st.rerun()
                         if b3.button("❌", key=f"bad_{subj}_{idx}"):
                             st.session_state[f"fail_{subj}_{idx}"] = True
-                            topic["level"] = 1
-                            topic["next_review"] = str(datetime.date.today() + datetime.timedelta(days=1))
+                            grade_topic(data, subj, topic, "bad")
                             save_data(st.session_state.data)
                             st.rerun()
                     
@@ -547,7 +964,7 @@ with tab2:
 
     # Iteramos sobre una copia de las claves
     for subj in list(data.keys()):
-        if subj == "general_notes": continue
+        if subj in META_KEYS: continue
         
         try:
             topic_list = data[subj]
@@ -555,9 +972,10 @@ with tab2:
                 st.error(f"⚠️ Datos corruptos en: {subj}")
                 continue 
 
-            # Cálculos
-            count_active = sum(1 for x in topic_list if isinstance(x, dict) and x.get('unlocked'))
-            count_total = len(topic_list)
+            # Cálculos (agregados precalculados)
+            subj_stats = data["stats"]["subjects"].get(subj, {"active": 0, "total": 0})
+            count_active = subj_stats["active"]
+            count_total = subj_stats["total"]
             
             label_expander = str(f"**{subj}** ({count_active}/{count_total})")
             
@@ -589,6 +1007,7 @@ with tab2:
                         "last_error": "", 
                         "extra_queue": True
                     })
+                    stats_topic_added(data["stats"], subj, topic_list[-1])
                     
                     # GUARDAMOS LA ASIGNATURA ACTIVA ANTES DEL RERUN
                     st.session_state["last_active_subj"] = subj
@@ -609,8 +1028,10 @@ with tab2:
                         act = cols[0].checkbox("", value=is_unlocked, key=f"chk_{safe_key}_{i}")
                         
                         if act != is_unlocked:
+                            before = topic_snapshot(topic)
                             topic["unlocked"] = act
                             if act: topic["next_review"] = str(datetime.date.today())
+                            stats_topic_changed(data["stats"], subj, before, topic)
                             
                             # GUARDAMOS LA ASIGNATURA ACTIVA ANTES DEL RERUN
                             st.session_state["last_active_subj"] = subj
@@ -674,7 +1095,7 @@ with tab3:
 
     has_errors = False
     for subj, topic_list in data.items():
-        if subj == "general_notes": continue
+        if subj in META_KEYS: continue
         err_topics = [t for t in topic_list if t.get("last_error")]
         if err_topics:
             has_errors = True
@@ -695,9 +1116,70 @@ with tab3:
         st.success("¡Excelente! No hay errores pendientes de repaso en el temario.")
 
 # ==========================================
-# TAB 4: AJUSTES
+# TAB 4: PANEL DE PROGRESO
 # ==========================================
 with tab4:
+    st.header("📊 Progreso")
+    stats = data["stats"]
+
+    # Todo sale de los agregados: el coste no depende del tamaño del historial
+    c1, c2, c3, c4 = st.columns(4)
+    total_topics = sum(s["total"] for s in stats["subjects"].values())
+    total_active = sum(s["active"] for s in stats["subjects"].values())
+    overdue = overdue_by_category(stats)
+    c1.metric("Temas activos", f"{total_active}/{total_topics}")
+    c2.metric("Atrasados", f"{sum(overdue.values())}")
+    today_roll = stats["daily"].get(str(datetime.date.today()), {})
+    c3.metric("Repasos hoy", f"{today_roll.get('reviews', 0)}")
+    week_days = [str(datetime.date.today() - datetime.timedelta(days=d)) for d in range(7)]
+    week_reviews = sum(stats["daily"].get(d, {}).get("reviews", 0) for d in week_days)
+    week_ok = sum(stats["daily"].get(d, {}).get("ok", 0) + stats["daily"].get(d, {}).get("mid", 0) for d in week_days)
+    c4.metric("Retención 7 días", f"{(100 * week_ok / week_reviews):.0f}%" if week_reviews else "—")
+
+    st.divider()
+    col_l, col_r = st.columns(2)
+    with col_l:
+        st.subheader("Distribución de niveles")
+        st.bar_chart({"Nivel": [f"Nv. {i}" for i in range(6)], "Temas": stats["levels"]}, x="Nivel", y="Temas")
+    with col_r:
+        st.subheader("Atrasados por categoría")
+        cats = sorted(overdue)
+        st.bar_chart({"Categoría": cats, "Atrasados": [overdue[c] for c in cats]}, x="Categoría", y="Atrasados")
+
+    st.subheader("Temas activos por asignatura")
+    subjects = sorted(stats["subjects"])
+    st.bar_chart({
+        "Asignatura": subjects,
+        "Activos": [stats["subjects"][s]["active"] for s in subjects],
+        "Bloqueados": [stats["subjects"][s]["total"] - stats["subjects"][s]["active"] for s in subjects],
+    }, x="Asignatura", y=["Activos", "Bloqueados"])
+
+    # Últimos DASHBOARD_DAYS días a partir de los resúmenes diarios
+    days = [datetime.date.today() - datetime.timedelta(days=d) for d in range(DASHBOARD_DAYS - 1, -1, -1)]
+    rolls = [stats["daily"].get(str(d), {}) for d in days]
+    st.subheader(f"Repasos diarios (últimos {DASHBOARD_DAYS} días)")
+    st.bar_chart({
+        "Día": [str(d) for d in days],
+        "✅": [r.get("ok", 0) for r in rolls],
+        "🆗": [r.get("mid", 0) for r in rolls],
+        "❌": [r.get("bad", 0) for r in rolls],
+    }, x="Día", y=["✅", "🆗", "❌"])
+
+    st.subheader("Tiempo por categoría (sesiones de repaso)")
+    cat_minutes = {}
+    for r in rolls:
+        for cat, c in r.get("by_cat", {}).items():
+            cat_minutes[cat] = cat_minutes.get(cat, 0) + c["sec"] / 60.0
+    if cat_minutes:
+        cats = sorted(cat_minutes)
+        st.bar_chart({"Categoría": cats, "Minutos": [round(cat_minutes[c], 1) for c in cats]}, x="Categoría", y="Minutos")
+    else:
+        st.caption("Aún no hay tiempo registrado. Usa la sesión de repaso rápido en la Agenda.")
+
+# ==========================================
+# TAB 5: AJUSTES
+# ==========================================
+with tab5:
     st.header("⚙️ Ajustes")
     with st.expander("Gestionar Asignaturas"):
         ns = st.text_input("Nombre Asignatura")
@@ -705,13 +1187,22 @@ with tab4:
         if st.button("Crear"):
             if ns and ns not in data:
                 data[ns] = [{"name": "Tema 1", "category": nc, "unlocked": True, "level": 0, "next_review": str(datetime.date.today()), "last_error": "", "extra_queue": False}]
+                stats_topic_added(data["stats"], ns, data[ns][0])
                 save_data(data)
                 st.rerun()
         
         st.divider()
-        ds = st.selectbox("Eliminar", [k for k in data.keys() if k != "general_notes"])
+        ds = st.selectbox("Eliminar", [k for k in data.keys() if k not in META_KEYS])
         if st.button("Eliminar Asignatura"):
+            # Aplicamos lo pendiente de la sesión de repaso antes de invalidar sus índices;
+            # se guarda todo junto con el save_data de abajo
+            if "review_session" in st.session_state:
+                apply_pending_grades(st.session_state.review_session)
+                del st.session_state["review_session"]
+            # Los simulacros sin corregir guardan posiciones: dejan de ser válidos
+            st.session_state.pop("simulacros", None)
             del data[ds]
+            data["stats"] = build_stats(data, data["stats"]["daily"])
             save_data(data)
             st.rerun()
 
@@ -720,4 +1211,6 @@ with tab4:
         new_defaults = create_defaults()
         save_data(new_defaults)
         st.session_state.data = new_defaults
+        st.session_state.pop("review_session", None)
+        st.session_state.pop("simulacros", None)
         st.rerun()